@@ -5,7 +5,7 @@ This module provides AI-powered analysis of user's problem-solving approaches.
 Evaluates responses and provides personalized feedback based on user history.
 """
 
-from services.llm.utils import MODEL_NAME, client, retry_with_backoff, safe_strip, parse_json_response, get_fallback_analysis
+from services.llm.utils import MODEL_NAME, client, safe_strip, parse_json_response, get_fallback_analysis
 from typing import Dict, Any
 import logging
 from services.rag.retriever_factory import get_rag_retriever
@@ -93,7 +93,6 @@ class ApproachAnalysisService:
             return "Candidate"
 
 
-    @retry_with_backoff
     async def analyze_approach(self, question: str, user_answer: str, user_name: str = None, previous_attempt: dict = None, personalized_guidance: str = None, user_patterns: Any = None, user_id: str = None) -> Dict[str, Any]: # type: ignore
         """
         Analyze user's approach to a question and provide personalized feedback.
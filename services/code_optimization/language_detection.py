@@ -7,6 +7,7 @@ optimized for performance in a code optimization endpoint.
 
 import logging
 import re
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,57 @@ HIGH_PROBABILITY_SQL_KEYWORDS = {
 # Define maximum number of characters to analyze for speed
 MAX_CHARS_TO_ANALYZE = 2000
 
+# Number of distinct samples whose detection result is memoized. Samples are
+# capped at MAX_CHARS_TO_ANALYZE, which bounds the cache's memory footprint.
+DETECTION_CACHE_SIZE = 1024
+
+# Statement prefixes that start most Python submissions. A hit at the start
+# of the sample or of any line is also a word-bounded keyword match, so it can
+# be decided with plain string operations before the regex engine runs.
+_PYTHON_LINE_PREFIXES = ('def ', 'class ', 'import ', 'from ', 'async def ', 'return ')
+_PYTHON_NEWLINE_PREFIXES = tuple('\n' + prefix for prefix in _PYTHON_LINE_PREFIXES)
+
+# Statements that can only open a SQL submission. Checked on the first word
+# only; WITH is left out because Python code commonly starts with it.
+_SQL_STATEMENT_STARTS = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP'})
+
+
+# Keyword detection tokenizes the sample once into maximal word runs and tests
+# the distinct words against frozensets. A keyword is a whole word run exactly
+# when it would match \bkeyword\b, so this is equivalent to a word-bounded
+# search for every keyword, without any per-keyword regex work.
+_PYTHON_KEYWORDS = frozenset(HIGH_PROBABILITY_PYTHON_KEYWORDS)
+_SQL_KEYWORDS = frozenset(keyword.upper() for keyword in HIGH_PROBABILITY_SQL_KEYWORDS)
+_WORD_PATTERN = re.compile(r'\w+')
+
+# ASCII variant for the common case of pure-ASCII source. With re.ASCII the
+# engine classifies word characters against ASCII tables only, which is
+# markedly faster and gives identical results on ASCII input.
+_WORD_PATTERN_ASCII = re.compile(r'\w+', re.ASCII)
+
+# Syntax markers used by the weighted fallback analysis, with ASCII variants
+_MYSQL_SYNTAX_REGEX = r'`[^`]+`|\bENGINE\s*=|@\w+'
+_PYTHON_SYNTAX_REGEX = r'__\w+__|\.append|\.join|\(self,'
+_MYSQL_SYNTAX_PATTERN = re.compile(_MYSQL_SYNTAX_REGEX, re.IGNORECASE)
+_PYTHON_SYNTAX_PATTERN = re.compile(_PYTHON_SYNTAX_REGEX)
+_MYSQL_SYNTAX_PATTERN_ASCII = re.compile(_MYSQL_SYNTAX_REGEX, re.IGNORECASE | re.ASCII)
+_PYTHON_SYNTAX_PATTERN_ASCII = re.compile(_PYTHON_SYNTAX_REGEX, re.ASCII)
+
+# String literals and '#' comments are blanked in a single regex pass before
+# keyword scanning, so that SQL embedded in Python strings or comments (or
+# Python words inside SQL strings) do not decide the result. Whichever starts
+# first wins: a quote inside a comment is dropped with the comment, and a '#'
+# inside a string is blanked with the string. Each string alternative is closed
+# by the same quote that opened it; single-line literals may not span a
+# newline, so a stray apostrophe cannot swallow the rest of the sample.
+_LITERAL_OR_COMMENT_PATTERN = re.compile(
+    r'"""[\s\S]*?"""'
+    r"|'''[\s\S]*?'''"
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|#[^\n]*'
+)
+
 
 def detect_language(code: str) -> str:
     """
@@ -36,50 +88,122 @@ def detect_language(code: str) -> str:
     Returns 'python' or 'sql'.
     """
     if not code or code.isspace():
-        logger.info("Empty code provided, defaulting to python")
+        logger.debug("Empty code provided, defaulting to python")
         return "python"
 
     # Analyze only the first part of the code for performance
     # This avoids scanning large files and is sufficient for most cases.
     sample_code = code[:MAX_CHARS_TO_ANALYZE]
+    return _detect_sample_language(sample_code)
+
+
+@lru_cache(maxsize=DETECTION_CACHE_SIZE)
+def _detect_sample_language(sample_code: str) -> str:
+    """
+    Classify a clipped code sample. Memoized because the same submission is
+    detected by the route and again by the optimizer (and on every retry).
+    """
+    # Cheapest check: the submission opens with a SQL statement or block
+    # comment. Runs first because multi-line queries often have a line that
+    # starts with 'from ', which the Python prefix check would claim.
+    if _starts_sql_statement(sample_code):
+        logger.debug("Fast detection: SQL statement start found.")
+        return "sql"
+
+    # Equally cheap: a Python statement prefix at the start of a line
+    if _starts_python_statement(sample_code):
+        logger.debug("Fast detection: Python statement prefix found.")
+        return "python"
+
+    sample_code = _strip_literals_and_comments(sample_code)
+
+    word_pattern = _WORD_PATTERN_ASCII if sample_code.isascii() else _WORD_PATTERN
+    words = set(word_pattern.findall(sample_code))
 
     # Simple, fast check for definitive Python keywords
-    for keyword in HIGH_PROBABILITY_PYTHON_KEYWORDS:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', sample_code):
-            logger.info(f"Fast detection: Python keyword '{keyword}' found.")
-            return "python"
+    matched = words & _PYTHON_KEYWORDS
+    if matched:
+        logger.debug("Fast detection: Python keyword '%s' found.", min(matched))
+        return "python"
 
     # Simple, fast check for definitive SQL keywords
-    for keyword in HIGH_PROBABILITY_SQL_KEYWORDS:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', sample_code, re.IGNORECASE):
-            logger.info(f"Fast detection: SQL keyword '{keyword}' found.")
-            return "sql"
+    matched = {word.upper() for word in words} & _SQL_KEYWORDS
+    if matched:
+        logger.debug("Fast detection: SQL keyword '%s' found.", min(matched))
+        return "sql"
 
     # If no definitive keywords are found, perform a quick, weighted check.
     # This handles ambiguous cases like simple variable assignments.
-    logger.info("No definitive keywords found, performing quick weighted analysis.")
+    logger.debug("No definitive keywords found, performing quick weighted analysis.")
     return _quick_weighted_analysis(sample_code)
 
 
+def _strip_literals_and_comments(code_sample: str) -> str:
+    """
+    Blank quoted string literals to an empty literal and drop '#' comments
+    (Python and MySQL) in one pass over the sample.
+    """
+    if '"' not in code_sample and "'" not in code_sample and '#' not in code_sample:
+        return code_sample
+    return _LITERAL_OR_COMMENT_PATTERN.sub(_blank_literal_or_comment, code_sample)
+
+
+def _blank_literal_or_comment(match: re.Match) -> str:
+    """
+    Replacement for _LITERAL_OR_COMMENT_PATTERN: keep a string's quotes only.
+    """
+    first = match.group(0)[0]
+    return '' if first == '#' else first * 2
+
+
+def _starts_python_statement(code_sample: str) -> bool:
+    """
+    Check whether the sample or any of its lines starts with a common Python statement.
+    """
+    if code_sample.lstrip().startswith(_PYTHON_LINE_PREFIXES):
+        return True
+    return any(prefix in code_sample for prefix in _PYTHON_NEWLINE_PREFIXES)
+
+
+def _starts_sql_statement(code_sample: str) -> bool:
+    """
+    Check whether the first word of the sample is a SQL statement keyword.
+    """
+    head = code_sample.lstrip()[:16]
+    if head.startswith('/*'):
+        return True
+    words = head.split(None, 1)
+    if not words or words[0].upper() not in _SQL_STATEMENT_STARTS:
+        return False
+    # A Python name such as 'update' followed by an assignment, call or
+    # attribute access is not a statement keyword
+    return len(words) == 1 or words[1][0] not in '=.(['
+
+
 def _quick_weighted_analysis(code_sample: str) -> str:
     """
     Performs a simple weighted analysis on a code sample.
     """
     sql_score = 0
     python_score = 0
+
+    if code_sample.isascii():
+        mysql_pattern, python_pattern = _MYSQL_SYNTAX_PATTERN_ASCII, _PYTHON_SYNTAX_PATTERN_ASCII
+    else:
+        mysql_pattern, python_pattern = _MYSQL_SYNTAX_PATTERN, _PYTHON_SYNTAX_PATTERN
     
     # Check for MySQL-specific syntax (highest confidence)
-    if re.search(r'`[^`]+`|\bENGINE\s*=|@\w+', code_sample, re.IGNORECASE):
+    if mysql_pattern.search(code_sample):
         sql_score += 5
         
     # Check for Python-specific syntax
-    if re.search(r'__\w+__|\.append|\.join|\(self,', code_sample):
+    if python_pattern.search(code_sample):
         python_score += 5
 
     # Check for assignment operators and semicolons
-    if re.search(r'=', code_sample):
+    if '=' in code_sample:
         python_score += 1
-    if re.search(r';', code_sample):
+    if ';' in code_sample:
         sql_score += 1
 
     if sql_score > python_score:
@@ -4,24 +4,11 @@ Optimization Prompts Module
 Contains language-specific prompts for code optimization.
 """
 
-
-def get_language_specific_prompt(language: str, question: str, description: str, user_code: str, sample_input: str, sample_output: str) -> str:
-    """
-    Generate detailed, comprehensive optimization prompts for better results.
-    """
-    if language == "sql":
-        return f"""
-You are a **senior MySQL performance engineer**. This SQL query has performance issues and needs significant optimization.
-
-**ORIGINAL QUERY (WITH PERFORMANCE ISSUES):**
-```sql
-{user_code}
-```
-
-**TASK:** {question}
-**DESCRIPTION:** {description}
-**EXPECTED OUTPUT:** {sample_output}
-**TABLE STRUCTURE:** {sample_input}
+# Prompt templates are plain str.format templates built once at import time.
+# Literal JSON braces are escaped as {{ }}. All instructions come first and the
+# per-request inputs last.
+_SQL_PROMPT_TEMPLATE = """
+You are a **senior MySQL performance engineer**. The SQL query at the end of this prompt has performance issues and needs significant optimization.
 
 **PERFORMANCE ISSUES TO FIX:**
 1. **INEFFICIENT SUBQUERIES**: IN clauses with subqueries can be slow and may not use indexes properly
@@ -52,23 +39,24 @@ You are a **senior MySQL performance engineer**. This SQL query has performance
 }}
 
 **CRITICAL:** Return a COMPLETELY DIFFERENT query structure that eliminates the performance issues while maintaining the same results. Keep comments concise and place them at the end.
-"""
 
-    else:  # Python
-        return f"""
-You are a **Senior Python Code Optimization Expert**. You MUST return Python code only.
+---INPUT---
 
-**IMPORTANT: This is PYTHON code optimization. Return ONLY Python code, NOT SQL.**
+**TASK:** {question}
+**DESCRIPTION:** {description}
+**EXPECTED OUTPUT:** {sample_output}
+**TABLE STRUCTURE:** {sample_input}
 
-**ORIGINAL PYTHON CODE:**
-```python
+**ORIGINAL QUERY (WITH PERFORMANCE ISSUES):**
+```sql
 {user_code}
 ```
+"""
 
-**TASK:** {question}
-**DESCRIPTION:** {description}
-**EXPECTED INPUT:** {sample_input}
-**EXPECTED OUTPUT:** {sample_output}
+_PYTHON_PROMPT_TEMPLATE = """
+You are a **Senior Python Code Optimization Expert**. You MUST return Python code only.
+
+**IMPORTANT: This is PYTHON code optimization. Return ONLY Python code, NOT SQL.**
 
 **PYTHON OPTIMIZATION REQUIREMENTS:**
 1. **MUST CHANGE** the Python code structure, formatting, or organization
@@ -97,4 +85,50 @@ You are a **Senior Python Code Optimization Expert**. You MUST return Python cod
 - Include proper Python syntax, indentation, and structure
 - Add concise Python-style comments (#) at the end, not throughout the code
 - Keep comments brief but informative
-"""
\ No newline at end of file
+
+---INPUT---
+
+**TASK:** {question}
+**DESCRIPTION:** {description}
+**EXPECTED INPUT:** {sample_input}
+**EXPECTED OUTPUT:** {sample_output}
+
+**ORIGINAL PYTHON CODE:**
+```python
+{user_code}
+```
+"""
+
+# Templates keyed by detected language; anything that is not SQL is Python
+_PROMPT_TEMPLATES = {
+    "sql": _SQL_PROMPT_TEMPLATE,
+    "python": _PYTHON_PROMPT_TEMPLATE,
+}
+
+# Extra instructions appended to the prompt when the first attempt returned
+# the original code unchanged.
+_RETRY_INSTRUCTIONS = {
+    "sql": "\n\n**RETRY INSTRUCTIONS:** The previous attempt failed. You MUST rewrite this query completely. Replace the inefficient subquery approach with a JOIN-based solution. Use CTEs or derived tables. The result MUST be structurally different from the original.",
+    "python": "\n\n**RETRY INSTRUCTIONS:** The previous attempt failed. You MUST change the code structure significantly. The result MUST be different from the original.",
+}
+
+
+def get_language_specific_prompt(language: str, question: str, description: str, user_code: str, sample_input: str, sample_output: str) -> str:
+    """
+    Generate detailed, comprehensive optimization prompts for better results.
+    """
+    template = _PROMPT_TEMPLATES.get(language, _PYTHON_PROMPT_TEMPLATE)
+    return template.format(
+        question=question,
+        description=description,
+        user_code=user_code,
+        sample_input=sample_input,
+        sample_output=sample_output
+    )
+
+
+def get_retry_instructions(language: str) -> str:
+    """
+    Instructions appended to the prompt for the more aggressive second attempt.
+    """
+    return _RETRY_INSTRUCTIONS.get(language, _RETRY_INSTRUCTIONS["python"])
@@ -27,6 +27,7 @@ from .interview_sessions import (
     transition_to_coding_phase,
     save_interview_feedback,
     get_user_interview_sessions,
+    SESSION_LISTING_PROJECTION,
     reconstruct_session_state
 )
 
@@ -72,6 +73,7 @@ __all__ = [
     "transition_to_coding_phase",
     "save_interview_feedback",
     "get_user_interview_sessions",
+    "SESSION_LISTING_PROJECTION",
     "reconstruct_session_state",
     
     # Personalization
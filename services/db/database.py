@@ -5,9 +5,11 @@ This module provides core database connection and management functions.
 Handles MongoDB connection, index creation, and user validation.
 """
 
+import asyncio
 import os
 import logging
-from motor.motor_asyncio import AsyncIOMotorClient
+from functools import lru_cache
+from pymongo import AsyncMongoClient, IndexModel
 from bson import ObjectId
 from datetime import datetime
 
@@ -16,14 +18,36 @@ logger = logging.getLogger(__name__)
 # Database connection
 client = None
 db = None
+# Event loop the current client was created on; the client's pool is bound to it
+_db_loop = None
+
+# Connection pool settings
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+# No warm connections by default, so a client discarded after an event loop
+# change holds no idle sockets
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+# Idle pooled connections are closed after this long, so the pool shrinks back
+# towards minPoolSize after a burst
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+# Wire protocol compression, in order of preference; zstd needs the zstandard
+# package and is skipped by the driver (with a warning) when it is missing
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "zstd,zlib")
+
+@lru_cache(maxsize=4096)
+def _oid(user_id):
+    """
+    Convert a user id to ObjectId when it is a valid ObjectId string.
+    Other ids (e.g. plain string user ids) are returned unchanged.
+    """
+    return ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
 
 async def get_db():
     """
     Get database instance.
-    Creates connection if not already established.
+    Creates connection if not already established on the running event loop.
     """
-    global db
-    if db is None:
+    if db is None or _db_loop is not asyncio.get_running_loop():
         await connect_to_db()
     return db
 
@@ -32,7 +56,7 @@ async def connect_to_db():
     Connect to MongoDB database.
     Uses environment variables for connection configuration.
     """
-    global client, db
+    global client, db, _db_loop
     try:
         mongodb_uri = os.getenv("MONGODB_URI")
         db_name = os.getenv("DB_NAME")
@@ -40,17 +64,66 @@ async def connect_to_db():
         if not mongodb_uri or not db_name:
             raise ValueError("MONGODB_URI and DB_NAME must be set in environment variables")
         
-        client = AsyncIOMotorClient(mongodb_uri)
+        # Close the client bound to the previous event loop before replacing it
+        old_client, client, db = client, None, None
+        if old_client is not None:
+            try:
+                await old_client.close()
+            except Exception as e:
+                logger.warning("Failed to close previous MongoDB client: %s", e)
+        
+        client = AsyncMongoClient(
+            mongodb_uri,
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+            compressors=MONGODB_COMPRESSORS
+        )
         db = client[db_name]
+        _db_loop = asyncio.get_running_loop()
         
         # Test connection
         await db.command("ping")
-        logger.info(f"Connected to MongoDB database: {db_name}")
+        logger.info("Connected to MongoDB database: %s", db_name)
         
     except Exception as e:
-        logger.error(f"Failed to connect to MongoDB: {str(e)}")
+        logger.error("Failed to connect to MongoDB: %s", e)
         raise
 
+# Index specs per collection, created with one createIndexes command each.
+# createIndexes is a no-op for indexes that already exist with the same spec.
+_COLLECTION_INDEXES = {
+    "user_ai_interactions": [
+        IndexModel([("user_id", 1)]),
+        IndexModel([("session_id", 1)]),
+        IndexModel([("timestamp", -1)]),
+        IndexModel([("endpoint", 1)]),
+        # Compound indexes for the per-user interaction reads: session lookups
+        # (user_id + input.session_id, sorted by timestamp) and most-recent
+        # history / session summaries (user_id, newest first)
+        IndexModel([("user_id", 1), ("input.session_id", 1), ("timestamp", 1)]),
+        IndexModel([("user_id", 1), ("timestamp", -1)])
+    ],
+    "interview_topics": [
+        IndexModel([("topic", 1)], unique=True)
+    ],
+    "mainquestionbanks": [
+        IndexModel([("topicId", 1)]),
+        IndexModel([("isAvailableForMock", 1)]),
+        IndexModel([("isAvailableForMockInterview", 1)]),
+        IndexModel([("isDeleted", 1)]),
+        # Compound indexes for the fetch_base_question $sample filter: one per
+        # $or branch so each branch is an index scan on topicId + isDeleted + flag
+        IndexModel([("topicId", 1), ("isDeleted", 1), ("isAvailableForMock", 1)]),
+        IndexModel([("topicId", 1), ("isDeleted", 1), ("isAvailableForMockInterview", 1)]),
+        # Compound indexes for the fetch_question_by_module $match/$sample
+        # pipelines so candidate selection is an index scan on module_code
+        IndexModel([("module_code", 1), ("isDeleted", 1), ("isAvailableForMockInterview", 1)]),
+        IndexModel([("module_code", 1), ("isDeleted", 1), ("question_type", 1)])
+    ]
+}
+
 async def create_indexes():
     """
     Create necessary database indexes for performance optimization.
@@ -59,28 +132,16 @@ async def create_indexes():
     try:
         db = await get_db()
         
-        # Create indexes for user_ai_interactions collection
-        await db.user_ai_interactions.create_index([("user_id", 1)])
-        await db.user_ai_interactions.create_index([("session_id", 1)])
-        await db.user_ai_interactions.create_index([("timestamp", -1)])
-        await db.user_ai_interactions.create_index([("endpoint", 1)])
-        
-        # Create indexes for users collection
-        await db.users.create_index([("_id", 1)])
-        
-        # Create indexes for interview_topics collection
-        await db.interview_topics.create_index([("topic", 1)], unique=True)
-        
-        # Create indexes for mainquestionbanks collection
-        await db.mainquestionbanks.create_index([("topicId", 1)])
-        await db.mainquestionbanks.create_index([("isAvailableForMock", 1)])
-        await db.mainquestionbanks.create_index([("isAvailableForMockInterview", 1)])
-        await db.mainquestionbanks.create_index([("isDeleted", 1)])
+        # One createIndexes command per collection, run concurrently
+        await asyncio.gather(*(
+            db[collection_name].create_indexes(indexes)
+            for collection_name, indexes in _COLLECTION_INDEXES.items()
+        ))
         
         logger.info("Database indexes created successfully")
         
     except Exception as e:
-        logger.error(f"Error creating indexes: {str(e)}")
+        logger.error("Error creating indexes: %s", e)
         raise
 
 async def check_collections():
@@ -91,23 +152,24 @@ async def check_collections():
     try:
         db = await get_db()
         
-        collections = await db.list_collection_names()
-        logger.info(f"Available collections: {collections}")
-        
-        # Check required collections
+        # Check required collections. estimated_document_count reads collection
+        # metadata instead of scanning, and reports 0 for a missing collection,
+        # so no separate list_collection_names round trip is needed.
         required_collections = ["users", "interview_topics", "mainquestionbanks", "user_ai_interactions"]
+        counts = await asyncio.gather(
+            *(db[collection_name].estimated_document_count() for collection_name in required_collections)
+        )
         
-        for collection_name in required_collections:
-            if collection_name in collections:
-                count = await db[collection_name].count_documents({})
-                logger.info(f"Collection '{collection_name}' exists with {count} documents")
+        for collection_name, count in zip(required_collections, counts):
+            if count:
+                logger.info("Collection '%s' exists with ~%s documents", collection_name, count)
             else:
-                logger.warning(f"Collection '{collection_name}' not found")
+                logger.warning("Collection '%s' not found or empty", collection_name)
         
         return True
         
     except Exception as e:
-        logger.error(f"Error checking collections: {str(e)}")
+        logger.error("Error checking collections: %s", e)
         return False
 
 async def validate_user_id(user_id: str) -> bool:
@@ -119,14 +181,10 @@ async def validate_user_id(user_id: str) -> bool:
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            user = await db.users.find_one({"_id": object_id})
-        except:
-            user = await db.users.find_one({"_id": user_id})
+        user = await db.users.find_one({"_id": _oid(user_id)})
         
         return user is not None
         
     except Exception as e:
-        logger.error(f"Error validating user_id: {str(e)}")
+        logger.error("Error validating user_id: %s", e)
         return False 
\ No newline at end of file
@@ -6,36 +6,59 @@ Provides functions for creating, updating, and retrieving interview sessions.
 """
 
 import logging
-from datetime import datetime
-from bson import ObjectId
-from .database import get_db
+from datetime import datetime, timezone
+from .database import get_db, _oid
 
 logger = logging.getLogger(__name__)
 
+# Fields needed to list a user's sessions (see UserSessionService.get_user_sessions);
+# leaves out the question/answer history and the stored ai_response
+SESSION_LISTING_PROJECTION = {
+    "session_id": 1,
+    "timestamp": 1,
+    "meta.session_data.topic": 1,
+    "meta.session_data.user_name": 1,
+    "meta.session_data.status": 1,
+    "meta.session_data.current_phase": 1,
+    "meta.session_data.total_questions": 1,
+    "meta.session_data.feedback": 1
+}
+
 def reconstruct_session_state(interactions):
     """
     Reconstruct session state from interaction history.
     Builds session data from sorted interactions including questions and clarifications.
     """
-    session_data = {"questions": [], "clarifications": [], "question_count": 1, "topic": None}
+    questions = []
+    clarifications = []
+    append_question = questions.append
+    append_clarification = clarifications.append
+    question_count = 1
+    topic = None
+    
     for inter in interactions:
-        inp = inter.get("input", {})
-        resp = inter.get("ai_response", {})
-        meta = inter.get("meta", {})
-        if meta.get("step") == "init":
-            session_data["topic"] = inp.get("topic")
-            session_data["questions"].append({"question": resp.get("base_question"), "answer": ""})
-            session_data["question_count"] = 1
-        elif meta.get("step") == "answer":
-            if "clarification" in meta and meta["clarification"]:
-                session_data["clarifications"].append({"clarification": inp.get("answer"), "response": resp.get("clarification")})
+        meta = inter.get("meta")
+        if not meta:
+            continue
+        step = meta.get("step")
+        if step == "init":
+            resp = inter.get("ai_response") or {}
+            topic = (inter.get("input") or {}).get("topic")
+            append_question({"question": resp.get("base_question"), "answer": ""})
+            question_count = 1
+        elif step == "answer":
+            inp = inter.get("input") or {}
+            resp = inter.get("ai_response") or {}
+            if meta.get("clarification"):
+                append_clarification({"clarification": inp.get("answer"), "response": resp.get("clarification")})
             else:
-                if session_data["questions"]:
-                    session_data["questions"][-1]["answer"] = inp.get("answer")
+                if questions:
+                    questions[-1]["answer"] = inp.get("answer")
                 if "question" in resp:
-                    session_data["questions"].append({"question": resp["question"], "answer": ""})
-                session_data["question_count"] = session_data.get("question_count", 1) + 1
-    return session_data
+                    append_question({"question": resp["question"], "answer": ""})
+                question_count += 1
+    
+    return {"questions": questions, "clarifications": clarifications, "question_count": question_count, "topic": topic}
 
 async def create_interview_session(user_id: str, session_id: str, topic: str, user_name: str, base_question_data: dict, first_follow_up: str, base_question_id=None):
     """
@@ -47,19 +70,15 @@ async def create_interview_session(user_id: str, session_id: str, topic: str, us
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            save_user_id = object_id
-        except:
-            save_user_id = user_id
+        save_user_id = _oid(user_id)
         
         # Get interview type from question data
         interview_type = base_question_data.get("interview_type", "approach")
         
         # Debug logging
-        logger.info(f"Creating interview session with interview_type: {interview_type}")
-        logger.info(f"Base question data keys: {list(base_question_data.keys())}")
-        logger.info(f"Base question data interview_type: {base_question_data.get('interview_type')}")
+        logger.info("Creating interview session with interview_type: %s", interview_type)
+        logger.debug("Base question data keys: %s", list(base_question_data.keys()))
+        logger.debug("Base question data interview_type: %s", base_question_data.get('interview_type'))
         
         # Create base ai_response structure
         ai_response = {
@@ -80,11 +99,13 @@ async def create_interview_session(user_id: str, session_id: str, topic: str, us
                 "expectedOutput": base_question_data.get("expectedOutput", "")
             })
         
-        # Create session document with all initial data
+        # Create session document with all initial data; the document and its
+        # first questions share one creation time
+        now = datetime.now(timezone.utc)
         session_doc = {
             "user_id": save_user_id,
             "session_id": session_id,
-            "timestamp": datetime.utcnow(),
+            "timestamp": now,
             "endpoint": "mock_interview",
             "input": {
                 "topic": topic,
@@ -107,7 +128,7 @@ async def create_interview_session(user_id: str, session_id: str, topic: str, us
                         {
                             "question": base_question_data["question"],
                             "answer": "",
-                            "timestamp": datetime.utcnow(),
+                            "timestamp": now,
                             "question_type": "base"
                         }
                     ],
@@ -115,7 +136,7 @@ async def create_interview_session(user_id: str, session_id: str, topic: str, us
                         {
                             "question": first_follow_up,
                             "answer": "",
-                            "timestamp": datetime.utcnow(),
+                            "timestamp": now,
                             "question_type": "follow_up",
                             **({"clarification_count": 0} if interview_type == "coding" else {})  # Only for coding interviews
                         }
@@ -133,10 +154,10 @@ async def create_interview_session(user_id: str, session_id: str, topic: str, us
         }
         
         result = await db.user_ai_interactions.insert_one(session_doc)
-        logger.info(f"Created {interview_type} interview session: {session_id} with _id: {result.inserted_id}")
+        logger.info("Created %s interview session: %s with _id: %s", interview_type, session_id, result.inserted_id)
         return result.inserted_id
     except Exception as e:
-        logger.error(f"Error creating interview session: {str(e)}", exc_info=True)
+        logger.error("Error creating interview session: %s", e, exc_info=True)
         raise
 
 async def get_interview_session(session_id: str):
@@ -150,71 +171,75 @@ async def get_interview_session(session_id: str):
         session = await db.user_ai_interactions.find_one({"session_id": session_id})
         return session
     except Exception as e:
-        logger.error(f"Error getting interview session: {str(e)}", exc_info=True)
+        logger.error("Error getting interview session: %s", e, exc_info=True)
         raise
 
 async def update_interview_session_answer(session_id: str, answer: str, is_clarification: bool = False):
     """
     Update the interview session with a new answer.
     Handles both regular answers and clarification requests.
+    Only the changed fields are written; the session is never rewritten whole.
     """
     try:
         db = await get_db()
-        
-        # Get the current session
-        session = await get_interview_session(session_id)
-        if not session:
-            raise Exception(f"Session not found: {session_id}")
-        
-        # Update the session data in the meta field
-        session_data = session["meta"]["session_data"]
+        now = datetime.now(timezone.utc)
         
         if is_clarification:
             # Add clarification
             clarification = {
                 "question": "Clarification request",
                 "answer": answer,
-                "timestamp": datetime.utcnow()
+                "timestamp": now
             }
-            session_data["clarifications"].append(clarification)
+            result = await db.user_ai_interactions.update_one(
+                {"session_id": session_id},
+                {
+                    "$push": {"meta.session_data.clarifications": clarification},
+                    "$set": {"timestamp": now}
+                }
+            )
+            if result.matched_count == 0:
+                raise Exception(f"Session not found: {session_id}")
         else:
-            # Update the latest follow-up question's answer
-            follow_up_questions = session_data.get("follow_up_questions", [])
+            # Only the follow-up questions are needed to locate the answer slot
+            session = await db.user_ai_interactions.find_one(
+                {"session_id": session_id},
+                {"meta.session_data.follow_up_questions": 1}
+            )
+            if not session:
+                raise Exception(f"Session not found: {session_id}")
+            
+            follow_up_questions = session.get("meta", {}).get("session_data", {}).get("follow_up_questions", [])
             if not follow_up_questions:
                 raise Exception("No follow-up questions found")
             
             # Debug logging
-            logger.info(f"Updating answer for session {session_id}. Current follow_up_questions: {[{'question': q.get('question', '')[:50], 'answer': q.get('answer', '')[:50], 'clarification_count': q.get('clarification_count', 0)} for q in follow_up_questions]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Updating answer for session %s. Current follow_up_questions: %s", session_id, [{'question': q.get('question', '')[:50], 'answer': q.get('answer', '')[:50], 'clarification_count': q.get('clarification_count', 0)} for q in follow_up_questions])
             
-            # Find the first unanswered question
-            for question in follow_up_questions:
+            # Find the first unanswered question; if every question is
+            # answered, the answer goes to the last one
+            for index, question in enumerate(follow_up_questions):
                 if not question.get("answer"):
-                    question["answer"] = answer
-                    logger.info(f"Updated question '{question.get('question', '')[:50]}...' with answer '{answer[:50]}...'")
                     break
             else:
-                # If no unanswered question found, add answer to the last question
-                if follow_up_questions:
-                    follow_up_questions[-1]["answer"] = answer
-                    logger.info(f"Updated last question '{follow_up_questions[-1].get('question', '')[:50]}...' with answer '{answer[:50]}...'")
+                index = len(follow_up_questions) - 1
+                question = follow_up_questions[index]
             
-            # Debug logging after update
-            logger.info(f"After update for session {session_id}. Updated follow_up_questions: {[{'question': q.get('question', '')[:50], 'answer': q.get('answer', '')[:50], 'clarification_count': q.get('clarification_count', 0)} for q in follow_up_questions]}")
-        
-        # Update the document
-        await db.user_ai_interactions.update_one(
-            {"session_id": session_id},
-            {
-                "$set": {
-                    "meta.session_data": session_data,
-                    "timestamp": datetime.utcnow()
+            await db.user_ai_interactions.update_one(
+                {"session_id": session_id},
+                {
+                    "$set": {
+                        f"meta.session_data.follow_up_questions.{index}.answer": answer,
+                        "timestamp": now
+                    }
                 }
-            }
-        )
+            )
+            logger.info("Updated question '%s...' with answer '%s...'", question.get('question', '')[:50], answer[:50])
         
-        logger.info(f"Updated interview session: {session_id} with answer")
+        logger.info("Updated interview session: %s with answer", session_id)
     except Exception as e:
-        logger.error(f"Error updating interview session: {str(e)}", exc_info=True)
+        logger.error("Error updating interview session: %s", e, exc_info=True)
         raise
 
 async def add_follow_up_question(session_id: str, question: str, question_id: str = None):
@@ -225,46 +250,40 @@ async def add_follow_up_question(session_id: str, question: str, question_id: st
     """
     try:
         db = await get_db()
+        now = datetime.now(timezone.utc)
         
-        # Get the current session
-        session = await get_interview_session(session_id)
+        # Only the interview type is needed to shape the new question
+        session = await db.user_ai_interactions.find_one(
+            {"session_id": session_id},
+            {"meta.session_data.interview_type": 1}
+        )
         if not session:
             raise Exception(f"Session not found: {session_id}")
         
-        # Update the session data
-        session_data = session["meta"]["session_data"]
-        interview_type = session_data.get("interview_type", "approach")
+        interview_type = session.get("meta", {}).get("session_data", {}).get("interview_type", "approach")
         
         new_question = {
             "question": question,
             "answer": "",
-            "timestamp": datetime.utcnow(),
+            "timestamp": now,
             "question_type": "follow_up",
             **({"clarification_count": 0} if interview_type == "coding" else {})  # Only for coding interviews
         }
         
-        session_data["follow_up_questions"].append(new_question)
-        session_data["total_questions"] += 1
-        
-        # Track attempted questions by ID or text
-        if "attempted_questions" not in session_data:
-            session_data["attempted_questions"] = []
-        if question_id:
-            if question_id not in session_data["attempted_questions"]:
-                session_data["attempted_questions"].append(question_id)
-        else:
-            # Fallback: use question text if ID not available
-            if question not in session_data["attempted_questions"]:
-                session_data["attempted_questions"].append(question)
-        
-        # Update the document
+        # Append the question, bump the count and track the attempted question
+        # by ID (or text if ID not available) in one in-place update
         await db.user_ai_interactions.update_one(
             {"session_id": session_id},
-            {"$set": {"meta.session_data": session_data, "timestamp": datetime.utcnow()}}
+            {
+                "$push": {"meta.session_data.follow_up_questions": new_question},
+                "$inc": {"meta.session_data.total_questions": 1},
+                "$addToSet": {"meta.session_data.attempted_questions": question_id or question},
+                "$set": {"timestamp": now}
+            }
         )
-        logger.info(f"Added follow-up question and updated attempted_questions for session: {session_id}")
+        logger.info("Added follow-up question and updated attempted_questions for session: %s", session_id)
     except Exception as e:
-        logger.error(f"Error adding follow-up question: {str(e)}", exc_info=True)
+        logger.error("Error adding follow-up question: %s", e, exc_info=True)
         raise
 
 async def transition_to_coding_phase(session_id: str):
@@ -275,29 +294,21 @@ async def transition_to_coding_phase(session_id: str):
     try:
         db = await get_db()
         
-        # Get the current session
-        session = await get_interview_session(session_id)
-        if not session:
-            raise Exception(f"Session not found: {session_id}")
-        
-        # Update the session data
-        session_data = session["meta"]["session_data"]
-        session_data["current_phase"] = "coding"
-        
-        # Update the document
-        await db.user_ai_interactions.update_one(
+        result = await db.user_ai_interactions.update_one(
             {"session_id": session_id},
             {
                 "$set": {
-                    "meta.session_data": session_data,
-                    "timestamp": datetime.utcnow()
+                    "meta.session_data.current_phase": "coding",
+                    "timestamp": datetime.now(timezone.utc)
                 }
             }
         )
+        if result.matched_count == 0:
+            raise Exception(f"Session not found: {session_id}")
         
-        logger.info(f"Transitioned session {session_id} to coding phase")
+        logger.info("Transitioned session %s to coding phase", session_id)
     except Exception as e:
-        logger.error(f"Error transitioning to coding phase: {str(e)}", exc_info=True)
+        logger.error("Error transitioning to coding phase: %s", e, exc_info=True)
         raise
 
 async def save_interview_feedback(session_id: str, feedback_data: dict):
@@ -308,56 +319,46 @@ async def save_interview_feedback(session_id: str, feedback_data: dict):
     try:
         db = await get_db()
         
-        # Get the current session
-        session = await get_interview_session(session_id)
-        if not session:
-            raise Exception(f"Session not found: {session_id}")
-        
-        # Update the session data
-        session_data = session["meta"]["session_data"]
-        session_data["feedback"] = feedback_data
-        session_data["status"] = "completed"
-        session_data["current_phase"] = "completed"
-        
-        # Update the document
-        await db.user_ai_interactions.update_one(
+        result = await db.user_ai_interactions.update_one(
             {"session_id": session_id},
             {
                 "$set": {
-                    "meta.session_data": session_data,
-                    "timestamp": datetime.utcnow()
+                    "meta.session_data.feedback": feedback_data,
+                    "meta.session_data.status": "completed",
+                    "meta.session_data.current_phase": "completed",
+                    "timestamp": datetime.now(timezone.utc)
                 }
             }
         )
+        if result.matched_count == 0:
+            raise Exception(f"Session not found: {session_id}")
         
-        logger.info(f"Saved feedback for session: {session_id}")
+        logger.info("Saved feedback for session: %s", session_id)
     except Exception as e:
-        logger.error(f"Error saving feedback: {str(e)}", exc_info=True)
+        logger.error("Error saving feedback: %s", e, exc_info=True)
         raise
 
-async def get_user_interview_sessions(user_id: str, limit: int = 20):
+async def get_user_interview_sessions(user_id: str, limit: int = 20, projection: dict = None):
     """
     Get all interview sessions for a user.
-    Returns structured interview sessions sorted by timestamp.
+    Returns structured interview sessions sorted by timestamp, limited to the
+    fields in projection when one is given.
     """
     try:
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            query_user_id = object_id
-        except:
-            query_user_id = user_id
+        query_user_id = _oid(user_id)
         
         sessions = await db.user_ai_interactions.find(
             {
                 "user_id": query_user_id,
                 "meta.session_type": "structured"
-            }
+            },
+            projection
         ).sort("timestamp", -1).limit(limit).to_list(length=limit)
         
         return sessions
     except Exception as e:
-        logger.error(f"Error getting user interview sessions: {str(e)}", exc_info=True)
+        logger.error("Error getting user interview sessions: %s", e, exc_info=True)
         raise 
\ No newline at end of file
@@ -8,9 +8,105 @@ Provides functions for analyzing user behavior and generating personalized guida
 import logging
 import time
 from collections import Counter
-from .database import get_db
+from .database import get_db, _oid
 from .user_interactions import get_user_interaction_history
 
+# Fields extract_interaction_patterns reads from each interaction; the rest
+# of the stored document is never looked at
+_PATTERN_ANALYSIS_PROJECTION = {
+    "endpoint": 1,
+    "meta.session_data.status": 1,
+    "meta.session_data.topic": 1,
+    "meta.session_data.feedback": 1,
+    "meta.session_data.metadata.language": 1,
+    "ai_response.score": 1,
+    "ai_response.areas_for_improvement": 1,
+    "ai_response.strengths": 1,
+    "input.user_answer": 1,
+    "input.answer": 1
+}
+
+def _endpoint_switch(mock_interview_expr, approach_analysis_expr, default):
+    """
+    Aggregation expression picking a per-endpoint value for an interaction.
+    """
+    return {"$switch": {
+        "branches": [
+            {"case": {"$eq": ["$endpoint", "mock_interview"]}, "then": mock_interview_expr},
+            {"case": {"$eq": ["$endpoint", "approach_analysis"]}, "then": approach_analysis_expr}
+        ],
+        "default": default
+    }}
+
+def _recent_distinct_facet(field: str):
+    """
+    Facet listing distinct non-empty mock interview values of field, most
+    recently seen first.
+    """
+    return [
+        {"$match": {"endpoint": "mock_interview", field: {"$nin": [None, ""]}}},
+        {"$group": {"_id": f"${field}", "last": {"$max": "$timestamp"}}},
+        {"$sort": {"last": -1}}
+    ]
+
+def _top_items_facet(field: str):
+    """
+    Facet returning the 3 most frequent entries of an array field; ties go to
+    the most recently seen entry.
+    """
+    return [
+        {"$unwind": f"${field}"},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}, "last": {"$max": "$timestamp"}}},
+        {"$sort": {"count": -1, "last": -1}},
+        {"$limit": 3}
+    ]
+
+# Everything analyze_user_patterns reports, reduced server-side from a user's
+# 50 most recent interactions; prefixed with a per-user $match at call time
+_USER_PATTERNS_STAGES = [
+    {"$sort": {"timestamp": -1}},
+    {"$limit": 50},
+    {"$project": {
+        "_id": 0,
+        "timestamp": 1,
+        "endpoint": 1,
+        "topic": "$meta.session_data.topic",
+        "language": "$meta.session_data.metadata.language",
+        "completed": {"$eq": ["$meta.session_data.status", "completed"]},
+        "weaknesses": _endpoint_switch(
+            {"$ifNull": ["$meta.session_data.feedback.points_to_address", []]},
+            {"$ifNull": ["$ai_response.areas_for_improvement", []]},
+            []
+        ),
+        "strengths": _endpoint_switch(
+            {"$ifNull": ["$meta.session_data.feedback.positive_points", []]},
+            {"$ifNull": ["$ai_response.strengths", []]},
+            []
+        ),
+        "score": _endpoint_switch("$meta.session_data.feedback.score", "$ai_response.score", None)
+    }},
+    {"$facet": {
+        "topics": _recent_distinct_facet("topic"),
+        "languages": _recent_distinct_facet("language"),
+        "weaknesses": _top_items_facet("weaknesses"),
+        "strengths": _top_items_facet("strengths"),
+        "scores": [
+            {"$match": {"score": {"$type": "number"}}},
+            {"$group": {"_id": None, "scores": {"$push": "$score"}}}
+        ],
+        "totals": [
+            {"$group": {
+                "_id": None,
+                "interactions": {"$sum": 1},
+                "sessions": {"$sum": {"$cond": [{"$eq": ["$endpoint", "mock_interview"]}, 1, 0]}},
+                "completed": {"$sum": {"$cond": [
+                    {"$and": [{"$eq": ["$endpoint", "mock_interview"]}, "$completed"]}, 1, 0
+                ]}}
+            }}
+        ]
+    }}
+]
+
 # Simple in-memory cache for user patterns (5 minute TTL)
 _pattern_cache = {}
 _cache_ttl = 300  # 5 minutes
@@ -24,7 +120,7 @@ async def get_enhanced_personalized_context(user_id: str, current_topic: str = N
     """
     try:
         # Get recent interactions (reduced from 15 to 6 for better performance)
-        recent_interactions = await get_user_interaction_history(user_id, limit=6)
+        recent_interactions = await get_user_interaction_history(user_id, limit=6, projection=_PATTERN_ANALYSIS_PROJECTION)
         
         # Get progress data if question_id provided
         progress_data = None
@@ -51,7 +147,7 @@ async def get_enhanced_personalized_context(user_id: str, current_topic: str = N
             "personalized_guidance": personalized_guidance
         }
     except Exception as e:
-        logger.error(f"Error getting enhanced personalized context: {str(e)}", exc_info=True)
+        logger.error("Error getting enhanced personalized context: %s", e, exc_info=True)
         return {"user_patterns": {}, "personalized_guidance": ""}
 
 async def extract_interaction_patterns(interactions: list, current_topic: str = None, user_id: str = None):
@@ -64,7 +160,7 @@ async def extract_interaction_patterns(interactions: list, current_topic: str =
         if user_id and user_id in _pattern_cache:
             cache_entry = _pattern_cache[user_id]
             if cache_entry["expires"] > time.time():
-                logger.info(f"Using cached patterns for user {user_id}")
+                logger.info("Using cached patterns for user %s", user_id)
                 return cache_entry["data"]
         
         patterns = {
@@ -166,11 +262,11 @@ async def extract_interaction_patterns(interactions: list, current_topic: str =
                 "data": patterns,
                 "expires": time.time() + _cache_ttl
             }
-            logger.info(f"Cached patterns for user {user_id}")
+            logger.info("Cached patterns for user %s", user_id)
         
         return patterns
     except Exception as e:
-        logger.error(f"Error extracting interaction patterns: {str(e)}", exc_info=True)
+        logger.error("Error extracting interaction patterns: %s", e, exc_info=True)
         return {}
 
 def generate_enhanced_guidance(patterns: dict, user_name: str = None):
@@ -225,7 +321,7 @@ def generate_enhanced_guidance(patterns: dict, user_name: str = None):
         
         return " ".join(guidance_parts)
     except Exception as e:
-        logger.error(f"Error generating enhanced guidance: {str(e)}", exc_info=True)
+        logger.error("Error generating enhanced guidance: %s", e, exc_info=True)
         return ""
 
 
@@ -233,86 +329,40 @@ async def analyze_user_patterns(user_id: str):
     """
     Analyze user patterns from previous interactions for personalization.
     Provides comprehensive analysis of user behavior and performance.
+    Topics, languages, top weaknesses/strengths, scores and completion counts
+    are all computed by one aggregation over the 50 most recent interactions.
     """
     try:
-        interactions = await get_user_interaction_history(user_id, limit=50)
+        db = await get_db()
         
-        patterns = {
-            "topics_attempted": [],
-            "common_weaknesses": [],
-            "strengths": [],
-            "average_scores": [],
-            "preferred_languages": [],
-            "session_completion_rate": 0,
-            "total_sessions": len(interactions)
-        }
+        pipeline = [{"$match": {"user_id": _oid(user_id)}}, *_USER_PATTERNS_STAGES]
+        cursor = await db.user_ai_interactions.aggregate(pipeline)
+        results = await cursor.to_list(length=1)
+        facets = results[0] if results else {}
         
-        completed_sessions = 0
-        total_sessions = 0
+        totals = facets["totals"][0] if facets.get("totals") else {}
+        scores = facets["scores"][0]["scores"] if facets.get("scores") else []
+        total_sessions = totals.get("sessions", 0)
         
-        for interaction in interactions:
-            endpoint = interaction.get("endpoint", "")
-            
-            if endpoint == "mock_interview":
-                total_sessions += 1
-                session_data = interaction.get("meta", {}).get("session_data", {})
-                if session_data.get("status") == "completed":
-                    completed_sessions += 1
-                
-                # Extract topic
-                topic = session_data.get("topic")
-                if topic and topic not in patterns["topics_attempted"]:
-                    patterns["topics_attempted"].append(topic)
-                
-                # Extract language preference
-                language = session_data.get("metadata", {}).get("language")
-                if language and language not in patterns["preferred_languages"]:
-                    patterns["preferred_languages"].append(language)
-                
-                # Extract feedback insights
-                feedback = session_data.get("feedback")
-                if feedback:
-                    if "points_to_address" in feedback:
-                        patterns["common_weaknesses"].extend(feedback["points_to_address"])
-                    if "positive_points" in feedback:
-                        patterns["strengths"].extend(feedback["positive_points"])
-                    if "score" in feedback:
-                        patterns["average_scores"].append(feedback["score"])
-            
-            elif endpoint == "approach_analysis":
-                # Extract approach analysis insights
-                ai_response = interaction.get("ai_response", {})
-                if "areas_for_improvement" in ai_response:
-                    patterns["common_weaknesses"].extend(ai_response["areas_for_improvement"])
-                if "strengths" in ai_response:
-                    patterns["strengths"].extend(ai_response["strengths"])
-                if "score" in ai_response:
-                    patterns["average_scores"].append(ai_response["score"])
-            
-            elif endpoint == "code_optimization":
-                # Extract code optimization insights
-                ai_response = interaction.get("ai_response", {})
-                if "optimization_summary" in ai_response:
-                    # Could extract patterns from optimization summaries
-                    pass
-        
-        # Calculate completion rate
-        if total_sessions > 0:
-            patterns["session_completion_rate"] = completed_sessions / total_sessions
-        
-        # Get most common patterns (top 3)
-        patterns["common_weaknesses"] = [item for item, count in Counter(patterns["common_weaknesses"]).most_common(3)]
-        patterns["strengths"] = [item for item, count in Counter(patterns["strengths"]).most_common(3)]
+        patterns = {
+            "topics_attempted": [doc["_id"] for doc in facets.get("topics", [])],
+            "common_weaknesses": [doc["_id"] for doc in facets.get("weaknesses", [])],
+            "strengths": [doc["_id"] for doc in facets.get("strengths", [])],
+            "average_scores": scores,
+            "preferred_languages": [doc["_id"] for doc in facets.get("languages", [])],
+            "session_completion_rate": totals.get("completed", 0) / total_sessions if total_sessions > 0 else 0,
+            "total_sessions": totals.get("interactions", 0)
+        }
         
         # Calculate average score
-        if patterns["average_scores"]:
-            patterns["average_score"] = sum(patterns["average_scores"]) / len(patterns["average_scores"])
+        if scores:
+            patterns["average_score"] = sum(scores) / len(scores)
         else:
             patterns["average_score"] = 0
         
         return patterns
     except Exception as e:
-        logger.error(f"Error analyzing user patterns: {str(e)}", exc_info=True)
+        logger.error("Error analyzing user patterns: %s", e, exc_info=True)
         return {}
 
 async def get_personalized_context(user_id: str, current_topic: str = None, user_name: str = None):
@@ -357,5 +407,5 @@ async def get_personalized_context(user_id: str, current_topic: str = None, user
         personalized_context["personalized_guidance"] = " ".join(guidance_parts)
         return personalized_context
     except Exception as e:
-        logger.error(f"Error getting personalized context: {str(e)}", exc_info=True)
+        logger.error("Error getting personalized context: %s", e, exc_info=True)
         return {"user_patterns": {}, "personalized_guidance": ""} 
\ No newline at end of file
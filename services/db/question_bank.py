@@ -5,12 +5,82 @@ This module handles question bank operations and topic management.
 Provides functions for fetching questions, topics, and user information.
 """
 
+import asyncio
 import logging
+import time
+from collections import defaultdict
 from bson import ObjectId
-from .database import get_db
+from .database import get_db, _oid
 
 logger = logging.getLogger(__name__)
 
+# Only the fields fetch_base_question formats into its response; topic names
+# are flattened server-side into a plain "tags" list
+_BASE_QUESTION_PROJECTION = {
+    "question": 1,
+    "base_code": 1,
+    "programming_language": 1,
+    "level": 1,
+    "description": 1,
+    "tags": {
+        "$map": {
+            "input": {"$ifNull": ["$topics", []]},
+            "as": "t",
+            "in": "$$t.topic_name"
+        }
+    }
+}
+
+# Shared pipeline stages for the fetch_base_question/fetch_question_by_module
+# $sample pipelines; built once and never mutated
+_SAMPLE_ONE_STAGE = {"$sample": {"size": 1}}
+_BASE_QUESTION_PROJECT_STAGE = {"$project": _BASE_QUESTION_PROJECTION}
+
+# Availability filter shared by both fetch_base_question query shapes
+_BASE_QUESTION_AVAILABILITY = {
+    "$or": [
+        {"isAvailableForMock": True},
+        {"isAvailableForMockInterview": True}
+    ],
+    "isDeleted": False
+}
+
+# Simple in-memory cache for topic name -> topic _id (5 minute TTL).
+# interview_topics changes rarely, so repeat lookups need not hit the database.
+_topic_id_cache = {}
+_topic_cache_ttl = 300  # 5 minutes
+_topic_cache_max_entries = 512
+# Per-topic locks so concurrent cache misses for one topic resolve it once;
+# an entry only lives while its topic is being resolved
+_topic_id_locks = defaultdict(asyncio.Lock)
+
+# Cached topic name list for get_available_topics (1 minute TTL)
+_topics_cache = {"data": None, "expires": 0.0}
+_topics_cache_ttl = 60  # 1 minute
+
+def _get_cached_topic_id(topic: str):
+    """
+    Return the cached interview_topics _id for a topic, or None on a miss.
+    """
+    cache_entry = _topic_id_cache.get(topic)
+    if cache_entry and cache_entry["expires"] > time.time():
+        return cache_entry["data"]
+    return None
+
+def _cache_topic_id(topic: str, topic_id) -> None:
+    """
+    Remember a resolved topic _id for _topic_cache_ttl seconds.
+    Keeps at most _topic_cache_max_entries topics, dropping expired entries
+    first and then the oldest ones.
+    """
+    now = time.time()
+    if topic not in _topic_id_cache and len(_topic_id_cache) >= _topic_cache_max_entries:
+        for cached_topic in [t for t, entry in _topic_id_cache.items() if entry["expires"] <= now]:
+            del _topic_id_cache[cached_topic]
+        while len(_topic_id_cache) >= _topic_cache_max_entries:
+            del _topic_id_cache[next(iter(_topic_id_cache))]
+    _topic_id_cache[topic] = {"data": topic_id, "expires": now + _topic_cache_ttl}
+
 async def fetch_base_question(topic: str):
     """
     Fetch base question for a topic from mainquestionbanks.
@@ -18,52 +88,70 @@ async def fetch_base_question(topic: str):
     """
     try:
         db = await get_db()
-        logger.info(f"Fetching base question for topic: {topic}")
-        
-        # Find topic document
-        topic_doc = await db.interview_topics.find_one({"topic": topic})
-        if not topic_doc:
-            raise Exception(f"Topic '{topic}' not found")
-        
-        topic_id = topic_doc["_id"]
-        logger.info(f"Found topic ID: {topic_id}")
+        logger.info("Fetching base question for topic: %s", topic)
 
-        # Build aggregation pipeline for random question selection
-        pipeline = [
-            {
-                "$match": {
-                    "topicId": topic_id,
-                    "$or": [
-                        {"isAvailableForMock": True},
-                        {"isAvailableForMockInterview": True}
-                    ],
-                    "isDeleted": False
-                }
-            },
-            {"$sample": {"size": 1}}
-        ]
+        result = None
+        topic_id = _get_cached_topic_id(topic)
+        if topic_id is None:
+            lock = _topic_id_locks[topic]
+            try:
+                async with lock:
+                    # Another request may have resolved the topic while we waited
+                    topic_id = _get_cached_topic_id(topic)
+                    if topic_id is None:
+                        # Cache miss: resolve the topic and sample one of its questions
+                        # in a single round trip via $lookup, then cache the topic id
+                        pipeline = [
+                            {"$match": {"topic": topic}},
+                            {"$project": {"_id": 1}},
+                            {
+                                "$lookup": {
+                                    "from": "mainquestionbanks",
+                                    "let": {"topic_id": "$_id"},
+                                    "pipeline": [
+                                        {
+                                            "$match": {
+                                                "$expr": {"$eq": ["$topicId", "$$topic_id"]},
+                                                **_BASE_QUESTION_AVAILABILITY
+                                            }
+                                        },
+                                        _SAMPLE_ONE_STAGE,
+                                        _BASE_QUESTION_PROJECT_STAGE
+                                    ],
+                                    "as": "questions"
+                                }
+                            }
+                        ]
+                        cursor = await db.interview_topics.aggregate(pipeline)
+                        topic_docs = await cursor.to_list(length=1)
+                        if not topic_docs:
+                            raise Exception(f"Topic '{topic}' not found")
 
-        # Check available question count
-        count = await db.mainquestionbanks.count_documents({
-            "topicId": topic_id,
-            "$or": [
-                {"isAvailableForMock": True},
-                {"isAvailableForMockInterview": True}
-            ],
-            "isDeleted": False
-        })
-        logger.warning(f"Found {count} available questions for topic '{topic}' with topicId {topic_id}")
+                        topic_id = topic_docs[0]["_id"]
+                        _cache_topic_id(topic, topic_id)
+                        result = topic_docs[0]["questions"]
+            finally:
+                # Waiters already hold the lock object; later callers hit the cache
+                _topic_id_locks.pop(topic, None)
 
-        # Execute aggregation pipeline
-        cursor = db.mainquestionbanks.aggregate(pipeline)
-        result = await cursor.to_list(length=1)
+        if result is None:
+            # Known topic: sample a question directly
+            pipeline = [
+                {"$match": {"topicId": topic_id, **_BASE_QUESTION_AVAILABILITY}},
+                _SAMPLE_ONE_STAGE,
+                _BASE_QUESTION_PROJECT_STAGE
+            ]
+            cursor = await db.mainquestionbanks.aggregate(pipeline)
+            result = await cursor.to_list(length=1)
+
+        logger.debug("Found topic ID: %s", topic_id)
 
         if not result:
-            logger.warning(f"No questions found for topic '{topic}' (topicId: {topic_id})")
+            logger.warning("No questions found for topic '%s' (topicId: %s)", topic, topic_id)
             raise Exception(f"No questions found for topic '{topic}' (topicId: {topic_id})")
 
         question_doc = result[0]
-        logger.info(f"Fetched question: {question_doc.get('question', 'No question text')}")
+        logger.debug("Fetched question: %s", question_doc.get('question', 'No question text'))
 
         # Return formatted question data
         return {
@@ -73,32 +161,43 @@ async def fetch_base_question(topic: str):
             "language": question_doc.get("programming_language", ""),
             "difficulty": question_doc.get("level", ""),
             "example": question_doc.get("description", ""),
-            "tags": [t["topic_name"] for t in question_doc.get("topics", [])]
+            "tags": question_doc.get("tags") or []
         }
 
     except Exception as e:
-        logger.error(f"Error fetching base question: {str(e)}", exc_info=True)
+        logger.error("Error fetching base question: %s", e, exc_info=True)
         raise
 
 async def get_available_topics():
     """
     Get list of available interview topics.
-    Returns all topics from interview_topics collection.
+    Returns all topics from interview_topics collection, cached for
+    _topics_cache_ttl seconds.
     """
+    if _topics_cache["data"] is not None and _topics_cache["expires"] > time.time():
+        return list(_topics_cache["data"])
+
     try:
         db = await get_db()
         
-        # Get all topics from interview_topics collection
-        topics = await db.interview_topics.find({}).to_list(length=None)
-        
-        # Extract topic names
-        topic_names = [topic["topic"] for topic in topics if "topic" in topic]
+        # Stream topic names from interview_topics; documents without a topic
+        # are filtered server-side and only the name is projected, so the full
+        # documents are neither sent nor decoded.
+        topic_names = [
+            topic["topic"]
+            async for topic in db.interview_topics.find(
+                {"topic": {"$exists": True}}, {"topic": 1, "_id": 0}
+            ).batch_size(500)
+            if "topic" in topic
+        ]
         
-        logger.info(f"Found {len(topic_names)} available topics")
-        return topic_names
+        logger.info("Found %s available topics", len(topic_names))
+        _topics_cache["data"] = topic_names
+        _topics_cache["expires"] = time.time() + _topics_cache_ttl
+        return list(topic_names)
         
     except Exception as e:
-        logger.error(f"Error getting available topics: {str(e)}", exc_info=True)
+        logger.error("Error getting available topics: %s", e, exc_info=True)
         return []
 
 async def fetch_question_by_module(module_code: str, attempted_questions=None):
@@ -111,7 +210,7 @@ async def fetch_question_by_module(module_code: str, attempted_questions=None):
         attempted_questions = []
     try:
         db = await get_db()
-        logger.info(f"Fetching question for module: {module_code}")
+        logger.info("Fetching question for module: %s", module_code)
         
         # First, check available questions for both types
         coding_count = await db.mainquestionbanks.count_documents({
@@ -128,10 +227,10 @@ async def fetch_question_by_module(module_code: str, attempted_questions=None):
             "_id": {"$nin": [ObjectId(qid) for qid in attempted_questions if ObjectId.is_valid(qid)]}
         })
         
-        logger.info(f"Found {coding_count} coding questions and {non_coding_count} non-coding (multi-line/case-study) questions for module '{module_code}' (excluding attempted)")
+        logger.info("Found %s coding questions and %s non-coding (multi-line/case-study) questions for module '%s' (excluding attempted)", coding_count, non_coding_count, module_code)
         
         if coding_count == 0 and non_coding_count == 0:
-            logger.error(f"NO QUESTIONS FOUND: No questions found for module_code='{module_code}' (coding: isAvailableForMockInterview=True, non-coding: question_type in ['multi-line', 'case-study'])")
+            logger.error("NO QUESTIONS FOUND: No questions found for module_code='%s' (coding: isAvailableForMockInterview=True, non-coding: question_type in ['multi-line', 'case-study'])", module_code)
             raise Exception(f"No questions found for module '{module_code}'")
         
         import random
@@ -143,7 +242,7 @@ async def fetch_question_by_module(module_code: str, attempted_questions=None):
         else:
             question_type = "non-coding"
         
-        logger.info(f"Selected question type: {question_type}")
+        logger.info("Selected question type: %s", question_type)
         
         # Build aggregation pipeline based on selected type
         if question_type == "coding":
@@ -163,7 +262,7 @@ async def fetch_question_by_module(module_code: str, attempted_questions=None):
                         "_id": {"$nin": [ObjectId(qid) for qid in attempted_questions if ObjectId.is_valid(qid)]}
                     }
                 },
-                {"$sample": {"size": 1}}
+                _SAMPLE_ONE_STAGE
             ]
         else:  # non-coding
             pipeline = [
@@ -175,28 +274,28 @@ async def fetch_question_by_module(module_code: str, attempted_questions=None):
                         "_id": {"$nin": [ObjectId(qid) for qid in attempted_questions if ObjectId.is_valid(qid)]}
                     }
                 },
-                {"$sample": {"size": 1}}
+                _SAMPLE_ONE_STAGE
             ]
 
         # Execute aggregation pipeline
-        cursor = db.mainquestionbanks.aggregate(pipeline)
+        cursor = await db.mainquestionbanks.aggregate(pipeline)
         result = await cursor.to_list(length=1)
 
         if not result:
-            logger.error(f"NO QUESTIONS RETURNED: Aggregation pipeline returned no results for module_code='{module_code}', question_type='{question_type}'")
+            logger.error("NO QUESTIONS RETURNED: Aggregation pipeline returned no results for module_code='%s', question_type='%s'", module_code, question_type)
             raise Exception(f"No questions found for module '{module_code}' (aggregation returned no results)")
 
         question_doc = result[0]
         actual_question_type = question_doc.get("question_type", "unknown")
         
-        logger.info(f"Fetched question: {question_doc.get('question', 'No question text')}")
-        logger.info(f"Expected question_type: {question_type}, Actual question_type: {actual_question_type}")
-        logger.info(f"isAvailableForMockInterview: {question_doc.get('isAvailableForMockInterview', False)}")
+        logger.debug("Fetched question: %s", question_doc.get('question', 'No question text'))
+        logger.debug("Expected question_type: %s, Actual question_type: %s", question_type, actual_question_type)
+        logger.debug("isAvailableForMockInterview: %s", question_doc.get('isAvailableForMockInterview', False))
         
         # Verify we got the correct question type
         coding_question_types = ["coding", "SQL", "sql"]
         if question_type == "coding" and actual_question_type not in coding_question_types:
-            logger.error(f"TYPE MISMATCH: Expected coding question but got {actual_question_type}")
+            logger.error("TYPE MISMATCH: Expected coding question but got %s", actual_question_type)
             # Try to find a coding question manually
             coding_question = await db.mainquestionbanks.find_one({
                 "module_code": module_code,
@@ -242,12 +341,12 @@ async def fetch_question_by_module(module_code: str, attempted_questions=None):
                 "expectedOutput": question_doc.get("output", "")
             })
         
-        logger.info(f"Final interview_type: {formatted_question['interview_type']}")
-        logger.info(f"Formatted question keys: {list(formatted_question.keys())}")
+        logger.info("Final interview_type: %s", formatted_question['interview_type'])
+        logger.debug("Formatted question keys: %s", list(formatted_question.keys()))
         return formatted_question
 
     except Exception as e:
-        logger.error(f"Error fetching question by module: {str(e)} | module_code={module_code}", exc_info=True)
+        logger.error("Error fetching question by module: %s | module_code=%s", e, module_code, exc_info=True)
         raise
 
 async def get_available_modules():
@@ -284,24 +383,24 @@ async def get_available_modules():
             }
         ]
         
-        modules = await db.mainquestionbanks.aggregate(pipeline).to_list(length=None)
+        cursor = await db.mainquestionbanks.aggregate(pipeline, batchSize=500)
         
-        # Format the response
+        # Format the response while streaming the grouped modules
         module_list = [
             {
                 "module_code": module["_id"],
                 "question_count": module["question_count"]
             }
-            for module in modules if module["_id"]
+            async for module in cursor if module["_id"]
         ]
         
-        logger.info(f"Found {len(module_list)} available modules (coding: isAvailableForMockInterview=True, approach: question_type='approach')")
+        logger.info("Found %s available modules (coding: isAvailableForMockInterview=True, approach: question_type='approach')", len(module_list))
         if not module_list:
             logger.error("NO MODULES FOUND: No modules found with isAvailableForMockInterview=True or question_type='approach' and isDeleted=False.\nCheck if the data exists and is correctly flagged in the database.")
         return module_list
         
     except Exception as e:
-        logger.error(f"Error getting available modules: {str(e)}", exc_info=True)
+        logger.error("Error getting available modules: %s", e, exc_info=True)
         return []
 
 async def get_user_name_from_id(user_id: str) -> str:
@@ -313,11 +412,7 @@ async def get_user_name_from_id(user_id: str) -> str:
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            user = await db.users.find_one({"_id": object_id})
-        except:
-            user = await db.users.find_one({"_id": user_id})
+        user = await db.users.find_one({"_id": _oid(user_id)})
         if user and "user_name" in user:
             return user["user_name"]
         return ""
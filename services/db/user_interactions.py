@@ -6,12 +6,22 @@ Manages interaction history, session data, and user analytics.
 """
 
 import logging
-from datetime import datetime
-from bson import ObjectId
-from .database import get_db
+from datetime import datetime, timezone
+from .database import get_db, _oid
 
 logger = logging.getLogger(__name__)
 
+# Static stages of the fetch_user_session_summaries pipeline; only the
+# $match and $limit stages depend on the call
+_SESSION_SUMMARY_GROUP_STAGE = {"$group": {
+    "_id": "$input.session_id",
+    "first": {"$first": "$timestamp"},
+    "last": {"$last": "$timestamp"},
+    "topic": {"$first": "$input.topic"},
+    "count": {"$sum": 1}
+}}
+_SESSION_SUMMARY_SORT_STAGE = {"$sort": {"last": -1}}
+
 async def save_user_ai_interaction(user_id: str, endpoint: str, input_data: dict, ai_response: dict, meta: dict = None):
     """
     Save user-AI interaction to database.
@@ -21,16 +31,12 @@ async def save_user_ai_interaction(user_id: str, endpoint: str, input_data: dict
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            save_user_id = object_id
-        except:
-            save_user_id = user_id
+        save_user_id = _oid(user_id)
         
         # Create interaction document
         doc = {
             "user_id": save_user_id,
-            "timestamp": datetime.utcnow(),
+            "timestamp": datetime.now(timezone.utc),
             "endpoint": endpoint,
             "input": input_data,
             "ai_response": ai_response
@@ -38,12 +44,12 @@ async def save_user_ai_interaction(user_id: str, endpoint: str, input_data: dict
         if meta:
             doc["meta"] = meta
         
-        logger.info(f"Attempting to save interaction document with user_id: {save_user_id}")
+        logger.debug("Attempting to save interaction document with user_id: %s", save_user_id)
         result = await db.user_ai_interactions.insert_one(doc)
-        logger.info(f"Successfully saved interaction with _id: {result.inserted_id}")
+        logger.info("Successfully saved interaction with _id: %s", result.inserted_id)
         return result
     except Exception as e:
-        logger.error(f"Error saving user-AI interaction: {str(e)}", exc_info=True)
+        logger.error("Error saving user-AI interaction: %s", e, exc_info=True)
         raise
 
 async def fetch_interactions_for_session(user_id: str, session_id: str):
@@ -53,23 +59,9 @@ async def fetch_interactions_for_session(user_id: str, session_id: str):
     """
     db = await get_db()
     # Convert string user_id to ObjectId if it's a valid ObjectId format
-    try:
-        object_id = ObjectId(user_id)
-        query_user_id = object_id
-    except:
-        query_user_id = user_id
-    
-    logger.info(f"Looking for interactions with user_id: {query_user_id}, session_id: {session_id}")
+    query_user_id = _oid(user_id)
     
-    # First, let's see what interactions exist for this user
-    all_user_interactions = await db.user_ai_interactions.find({"user_id": query_user_id}).to_list(length=None)
-    logger.info(f"Found {len(all_user_interactions)} total interactions for user {user_id}")
-    
-    # Log the session_ids in the user's interactions
-    for interaction in all_user_interactions:
-        input_data = interaction.get("input", {})
-        session_id_in_db = input_data.get("session_id")
-        logger.info(f"Interaction session_id: {session_id_in_db}")
+    logger.info("Looking for interactions with user_id: %s, session_id: %s", query_user_id, session_id)
     
     # Fetch interactions for specific session
     interactions = await db.user_ai_interactions.find({
@@ -77,7 +69,7 @@ async def fetch_interactions_for_session(user_id: str, session_id: str):
         "input.session_id": session_id
     }).sort("timestamp", 1).to_list(length=None)
     
-    logger.info(f"Found {len(interactions)} interactions for session {session_id}")
+    logger.info("Found %s interactions for session %s", len(interactions), session_id)
     return interactions
 
 async def fetch_user_history(user_id: str, limit: int = 50):
@@ -87,40 +79,33 @@ async def fetch_user_history(user_id: str, limit: int = 50):
     """
     db = await get_db()
     # Convert string user_id to ObjectId if it's a valid ObjectId format
-    try:
-        object_id = ObjectId(user_id)
-        query_user_id = object_id
-    except:
-        query_user_id = user_id
+    query_user_id = _oid(user_id)
     
     interactions = await db.user_ai_interactions.find({
         "user_id": query_user_id
     }).sort("timestamp", -1).limit(limit).to_list(length=limit)
     return interactions
 
-async def get_user_interaction_history(user_id: str, limit: int = 20):
+async def get_user_interaction_history(user_id: str, limit: int = 20, projection: dict = None):
     """
     Get user's interaction history for personalization.
-    Returns recent interactions for analysis and pattern recognition.
+    Returns recent interactions for analysis and pattern recognition, limited
+    to the fields in projection when one is given.
     """
     try:
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            query_user_id = object_id
-        except:
-            query_user_id = user_id
+        query_user_id = _oid(user_id)
         
         # Get recent interactions across all endpoints
         interactions = await db.user_ai_interactions.find(
-            {"user_id": query_user_id}
+            {"user_id": query_user_id}, projection
         ).sort("timestamp", -1).limit(limit).to_list(length=limit)
         
         return interactions
     except Exception as e:
-        logger.error(f"Error getting user interaction history: {str(e)}", exc_info=True)
+        logger.error("Error getting user interaction history: %s", e, exc_info=True)
         raise
 
 async def fetch_user_session_summaries(user_id: str, limit: int = 20):
@@ -130,26 +115,17 @@ async def fetch_user_session_summaries(user_id: str, limit: int = 20):
     """
     db = await get_db()
     # Convert string user_id to ObjectId if it's a valid ObjectId format
-    try:
-        object_id = ObjectId(user_id)
-        query_user_id = object_id
-    except:
-        query_user_id = user_id
+    query_user_id = _oid(user_id)
     
     # Aggregate sessions by session_id
     pipeline = [
         {"$match": {"user_id": query_user_id}},
-        {"$group": {
-            "_id": "$input.session_id",
-            "first": {"$first": "$timestamp"},
-            "last": {"$last": "$timestamp"},
-            "topic": {"$first": "$input.topic"},
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"last": -1}},
+        _SESSION_SUMMARY_GROUP_STAGE,
+        _SESSION_SUMMARY_SORT_STAGE,
         {"$limit": limit}
     ]
-    summaries = await db.user_ai_interactions.aggregate(pipeline).to_list(length=limit)
+    cursor = await db.user_ai_interactions.aggregate(pipeline)
+    summaries = await cursor.to_list(length=limit)
     
     # Format output
     return [
@@ -172,11 +148,7 @@ async def get_user_name_from_history(user_id: str) -> str:
         db = await get_db()
         
         # Convert string user_id to ObjectId if it's a valid ObjectId format
-        try:
-            object_id = ObjectId(user_id)
-            query_user_id = object_id
-        except:
-            query_user_id = user_id
+        query_user_id = _oid(user_id)
         
         # Get the most recent session for this user
         session = await db.user_ai_interactions.find_one(
@@ -192,5 +164,5 @@ async def get_user_name_from_history(user_id: str) -> str:
         
         return "Candidate"
     except Exception as e:
-        logger.error(f"Error getting user name from history: {str(e)}", exc_info=True)
+        logger.error("Error getting user name from history: %s", e, exc_info=True)
         return "Candidate" 
\ No newline at end of file
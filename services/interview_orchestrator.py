@@ -7,6 +7,7 @@ flow progression, and phase transitions using AI instead of hardcoded rules.
 """
 
 import logging
+import re
 from typing import Dict, Any, Optional, List
 from services.llm.utils import client, retry_with_backoff, safe_strip
 from services.db import (
@@ -19,10 +20,13 @@ from openai.types.chat import (
     ChatCompletionSystemMessageParam,
     ChatCompletionUserMessageParam
 )
-from datetime import datetime
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Fenced code blocks removed from clarification replies
+_CODE_FENCE_PATTERN = re.compile(r"```[\s\S]*?```")
+
 class InterviewOrchestrator:
     """Manages entire interview flow using pure LLM approach."""
     
@@ -637,7 +641,7 @@ Respond with the JSON object as specified above."""
                     {
                         "$set": {
                             "meta.session_data": session_data,
-                            "timestamp": datetime.utcnow()
+                            "timestamp": datetime.now(timezone.utc)
                         }
                     }
                 )
@@ -667,7 +671,7 @@ Respond with the JSON object as specified above."""
                 {
                     "$set": {
                         "meta.session_data": session_data,
-                        "timestamp": datetime.utcnow()
+                        "timestamp": datetime.now(timezone.utc)
                     }
                 }
             )
@@ -697,7 +701,7 @@ Respond with the JSON object as specified above."""
                 {
                     "$set": {
                         "meta.session_data": session_data,
-                        "timestamp": datetime.utcnow()
+                        "timestamp": datetime.now(timezone.utc)
                     }
                 }
             )
@@ -727,7 +731,7 @@ Respond with the JSON object as specified above."""
                 {
                     "$set": {
                         "meta.session_data": session_data,
-                        "timestamp": datetime.utcnow()
+                        "timestamp": datetime.now(timezone.utc)
                     }
                 }
             )
@@ -762,7 +766,7 @@ Respond with the JSON object as specified above."""
                     {
                         "$set": {
                             "meta.session_data": session_data,
-                            "timestamp": datetime.utcnow()
+                            "timestamp": datetime.now(timezone.utc)
                         }
                     }
                 )
@@ -778,7 +782,7 @@ Respond with the JSON object as specified above."""
                         {
                             "$set": {
                                 "meta.session_data": session_data,
-                                "timestamp": datetime.utcnow()
+                                "timestamp": datetime.now(timezone.utc)
                             }
                         }
                     )
@@ -880,8 +884,7 @@ class CodingPhaseOrchestrator:
                 message = safe_strip(getattr(response.choices[0].message, 'content', None))
                 # Safety net: strip code fences if any slipped through
                 if message and "```" in message:
-                    import re
-                    message = re.sub(r"```[\s\S]*?```", "[Let's focus on approach and constraints rather than code.]", message)
+                    message = _CODE_FENCE_PATTERN.sub("[Let's focus on approach and constraints rather than code.]", message)
             except Exception as e:
                 logger.error(f"Error generating clarification: {str(e)}")
                 message = "Please clarify what specific aspect you need help with."
@@ -918,7 +921,7 @@ class CodingPhaseOrchestrator:
             {
                 "$set": {
                     "meta.session_data": self.session_data,
-                    "timestamp": datetime.utcnow()
+                    "timestamp": datetime.now(timezone.utc)
                 }
             }
         )
@@ -5,14 +5,13 @@ This module provides AI-powered clarification responses during coding interviews
 Helps candidates understand problems better without giving away solutions.
 """
 
-from services.llm.utils import client, retry_with_backoff, safe_strip, get_fallback_clarification
+from services.llm.utils import client, safe_strip, get_fallback_clarification
 from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
 import logging
 from typing import Union
 
 logger = logging.getLogger(__name__)
 
-@retry_with_backoff
 async def get_clarification(main_question: str, clarification_request: str) -> str:
     """
     Generate clarification response for coding interview questions.
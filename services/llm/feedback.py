@@ -6,14 +6,13 @@ Analyzes conversation history and provides personalized feedback with recommenda
 """
 
 from services.llm.utils import (
-    MODEL_NAME, client, retry_with_backoff, safe_strip, parse_json_response, get_fallback_feedback
+    MODEL_NAME, client, safe_strip, parse_json_response, get_fallback_feedback
 )
 from typing import List, Dict, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
-@retry_with_backoff
 async def get_feedback(conversation: List[Dict[str, Any]], user_name: str, previous_attempt: dict = None, personalized_guidance: str = None, user_patterns: Any = None, code_data: dict = None) -> dict:
     """
     Generate comprehensive feedback for interview session.
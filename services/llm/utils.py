@@ -35,8 +35,25 @@ RATE_LIMIT_CALLS_PER_MINUTE = int(os.getenv("OPENAI_RATE_LIMIT", "50"))
 RATE_LIMIT_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
 RATE_LIMIT_BASE_DELAY = float(os.getenv("OPENAI_BASE_DELAY", "1.0"))
 
+# HTTP connection pool configuration for the shared client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60.0"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5.0"))
+
 # === Shared Async OpenAI Client ===
-client = openai.AsyncOpenAI(api_key=openai_api_key)
+# One pooled HTTP client for every LLM call in the process, so concurrent
+# requests reuse warm keep-alive connections instead of opening new ones.
+client = openai.AsyncOpenAI(
+    api_key=openai_api_key,
+    http_client=openai.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    ),
+)
 logger.info("Shared OpenAI client initialized")
 
 # === Model Name ===
@@ -99,6 +116,7 @@ def retry_with_backoff(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awa
 
         logger.error(f"Failed after {MAX_RETRIES} attempts: {str(last_error)}")
         raise last_error or Exception("Unknown error during OpenAI call")
+
     return wrapper
 
 # === Rate Limiting Utility ===
@@ -202,16 +220,19 @@ def get_fallback_clarification() -> str:
     """
     return "Please rephrase your question."
 
-def get_fallback_optimized_code() -> str:
+# Constant payload; get_fallback_optimized_code hands out shallow copies
+_FALLBACK_OPTIMIZED_CODE = {
+    "optimized_code": "# Error: Could not optimize code. Please try again.",
+    "optimization_summary": "System error occurred during optimization. The original code has been returned unchanged.",
+    "error_details": "The optimization service encountered an error. This could be due to temporary service issues or invalid input. Please verify your code and try again."
+}
+
+def get_fallback_optimized_code() -> dict:
     """
     Return fallback code when optimization fails.
-    Returns a valid JSON string with error information.
+    Returned as a dict, like the other fallbacks, so callers need not parse it.
     """
-    return json.dumps({
-        "optimized_code": "# Error: Could not optimize code. Please try again.",
-        "optimization_summary": "System error occurred during optimization. The original code has been returned unchanged.",
-        "error_details": "The optimization service encountered an error. This could be due to temporary service issues or invalid input. Please verify your code and try again."
-    })
+    return dict(_FALLBACK_OPTIMIZED_CODE)
 
 def get_fallback_feedback(user_name: str = "Candidate") -> dict:
     """
@@ -12,6 +12,7 @@ import logging
 from typing import Dict, Any, List
 from services.db import (
     get_user_interview_sessions, 
+    SESSION_LISTING_PROJECTION,
     get_user_name_from_id, 
     get_enhanced_personalized_context,
     validate_user_id
@@ -30,7 +31,7 @@ class UserSessionService:
         if not await validate_user_id(self.user_id):
             raise ValueError("User not found")
         
-        sessions = await get_user_interview_sessions(self.user_id, limit)
+        sessions = await get_user_interview_sessions(self.user_id, limit, projection=SESSION_LISTING_PROJECTION)
         
         # Format response with session metadata
         formatted_sessions = []